@@ -1,16 +1,18 @@
 from __future__ import annotations
 
+import heapq
+import sys
+from collections import ChainMap
 from dataclasses import dataclass
-from typing import Any
-from urllib.parse import parse_qs, urlparse
+from typing import Any, Dict, Mapping, cast
+from urllib.parse import SplitResult, parse_qsl, urlsplit
 
 from opentelemetry import context
 from opentelemetry.sdk.trace import ReadableSpan, Span
 from opentelemetry.sdk.util.instrumentation import InstrumentationScope
 from opentelemetry.semconv.trace import SpanAttributes
 from opentelemetry.trace import SpanKind, Status, StatusCode
-
-import logfire
+from opentelemetry.util import types as otel_types
 
 from ..constants import (
     ATTRIBUTES_LOG_LEVEL_NUM_KEY,
@@ -20,12 +22,12 @@ from ..constants import (
     log_level_attributes,
 )
 from ..db_statement_summary import message_from_db_statement
-from ..scrubbing import BaseScrubber
+from ..scrubbing import BaseScrubber, NoopScrubber
 from ..utils import (
+    ASGI_SEND_RECEIVE_SPAN_NAME_SUFFIXES,
     ReadableSpanDict,
-    is_asgi_send_receive_span_name,
     is_instrumentation_suppressed,
-    span_to_dict,
+    suppressed_context,
     truncate_string,
 )
 from .wrapper import WrapperSpanProcessor
@@ -37,17 +39,25 @@ class CheckSuppressInstrumentationProcessorWrapper(WrapperSpanProcessor):
     Placed at the root of the tree of processors.
     """
 
+    # These run for every span, so attach/detach the suppressed context directly
+    # instead of using the `suppress_instrumentation()` context manager.
     def on_start(self, span: Span, parent_context: context.Context | None = None) -> None:
         if is_instrumentation_suppressed():
             return
-        with logfire.suppress_instrumentation():
+        token = context.attach(suppressed_context())
+        try:
             super().on_start(span, parent_context)
+        finally:
+            context.detach(token)
 
     def on_end(self, span: ReadableSpan) -> None:
         if is_instrumentation_suppressed():
             return
-        with logfire.suppress_instrumentation():
+        token = context.attach(suppressed_context())
+        try:
             super().on_end(span)
+        finally:
+            context.detach(token)
 
 
 @dataclass
@@ -69,26 +79,125 @@ class MainSpanProcessorWrapper(WrapperSpanProcessor):
         super().on_start(span, parent_context)
 
     def on_end(self, span: ReadableSpan) -> None:
-        span_dict = span_to_dict(span)
-        _tweak_asgi_send_receive_spans(span_dict)
-        _tweak_sqlalchemy_connect_spans(span_dict)
-        _tweak_http_spans(span_dict)
-        _summarize_db_statement(span_dict)
-        _set_error_level_and_status(span_dict)
+        tweaks = _classify(span)
+        if not tweaks and isinstance(self.scrubber, NoopScrubber):
+            # Nothing below would change the span, so skip all the work.
+            super().on_end(span)
+            return
+
+        overlay = _SpanDictOverlay(span)
+        span_dict = cast(ReadableSpanDict, overlay)
+        # Collect all attribute changes and apply them in one go at the end,
+        # rather than each function below copying all the attributes to change one or two.
+        attributes_patch: AttributesPatch = {}
+        if tweaks & _ASGI_SEND_RECEIVE:
+            _tweak_asgi_send_receive_spans(span_dict, attributes_patch)
+        if tweaks & _SQLALCHEMY_CONNECT:
+            _tweak_sqlalchemy_connect_spans(span_dict, attributes_patch)
+        if tweaks & _HTTP:
+            _tweak_http_spans(span_dict, attributes_patch)
+        if tweaks & _DB_STATEMENT:
+            _summarize_db_statement(span_dict, attributes_patch)
+        if tweaks & _ERROR_LEVEL_OR_STATUS:
+            _set_error_level_and_status(span_dict, attributes_patch)
+        if attributes_patch:
+            span_dict['attributes'] = {**span_dict['attributes'], **attributes_patch}
         self.scrubber.scrub_span(span_dict)
-        span = ReadableSpan(**span_dict)
+        if overlay:
+            span = ReadableSpan(**{key: overlay[key] for key in ReadableSpanDict.__annotations__})
         super().on_end(span)
 
 
-def _set_error_level_and_status(span: ReadableSpanDict) -> None:
+class _SpanDictOverlay(Dict[str, Any]):
+    """A `ReadableSpanDict` which only stores the fields that have been set.
+
+    Other fields are read from the original span on demand,
+    so a span that ends up unchanged doesn't need to be copied into a dict and rebuilt.
+    """
+
+    def __init__(self, span: ReadableSpan) -> None:
+        super().__init__()
+        self.span = span
+
+    def __missing__(self, key: str) -> Any:
+        if key == 'attributes':
+            return self.span.attributes or {}
+        return getattr(self.span, key)
+
+
+AttributesPatch = Dict[str, otel_types.AttributeValue]
+
+# Built once and shared between spans, so these must never be mutated.
+_DEBUG_LEVEL_ATTRIBUTES = log_level_attributes('debug')
+_ERROR_LEVEL_ATTRIBUTES = log_level_attributes('error')
+
+# Bound once so that the functions below avoid looking these up on `SpanAttributes` for every span.
+_HTTP_METHOD_KEY = SpanAttributes.HTTP_METHOD
+_HTTP_ROUTE_KEY = SpanAttributes.HTTP_ROUTE
+_HTTP_TARGET_KEY = SpanAttributes.HTTP_TARGET
+_HTTP_URL_KEY = SpanAttributes.HTTP_URL
+_DB_SYSTEM_KEY = SpanAttributes.DB_SYSTEM
+_DB_STATEMENT_KEY = SpanAttributes.DB_STATEMENT
+
+_HTTP_ATTRIBUTE_KEYS = (_HTTP_METHOD_KEY, _HTTP_ROUTE_KEY, _HTTP_TARGET_KEY, _HTTP_URL_KEY)
+
+
+# Flags returned by `_classify`, one for each function that on_end may need to call.
+_ASGI_SEND_RECEIVE = 1
+_SQLALCHEMY_CONNECT = 2
+_HTTP = 4
+_DB_STATEMENT = 8
+_ERROR_LEVEL_OR_STATUS = 16
+
+
+def _classify(span: ReadableSpan) -> int:
+    """Cheaply check which of the functions below might change the span, as a combination of the flags above.
+
+    This examines the span's name, scope, and attributes once so that the functions themselves don't have to.
+    It can give false positives, but must never leave out the flag of a function that would change the span.
+    Checking the original span is enough: earlier tweaks never make a later one necessary.
+    """
+    name = span.name
+    scope = span.instrumentation_scope
+    attributes = span.attributes or {}
+    tweaks = 0
+    if _is_asgi_send_receive_span(name, scope):
+        tweaks |= _ASGI_SEND_RECEIVE
+    elif name == 'connect' and scope is not None and scope.name == _SQLALCHEMY_SCOPE_NAME:
+        tweaks |= _SQLALCHEMY_CONNECT
+    if ATTRIBUTES_MESSAGE_TEMPLATE_KEY not in attributes and any(key in attributes for key in _HTTP_ATTRIBUTE_KEYS):
+        tweaks |= _HTTP
+    if _DB_STATEMENT_KEY in attributes:
+        tweaks |= _DB_STATEMENT
+    status = span.status
+    if status.status_code == StatusCode.ERROR:
+        if ATTRIBUTES_LOG_LEVEL_NUM_KEY not in attributes:
+            tweaks |= _ERROR_LEVEL_OR_STATUS
+    elif status.is_unset:
+        level = attributes.get(ATTRIBUTES_LOG_LEVEL_NUM_KEY)
+        if isinstance(level, int) and level >= LEVEL_NUMBERS['error']:
+            tweaks |= _ERROR_LEVEL_OR_STATUS
+    return tweaks
+
+
+def _attributes_with_patch(
+    span: ReadableSpanDict, attributes_patch: AttributesPatch
+) -> Mapping[str, otel_types.AttributeValue]:
+    """Return the span's attributes as they will be after applying `attributes_patch`."""
+    if attributes_patch:
+        return ChainMap(attributes_patch, span['attributes'])  # type: ignore
+    return span['attributes']
+
+
+def _set_error_level_and_status(span: ReadableSpanDict, attributes_patch: AttributesPatch) -> None:
     """Default the log level to error if the status code is error, and vice versa.
 
     This makes querying for `level` and `otel_status_code` interchangeable ways to find errors.
     """
     status = span['status']
-    attributes = span['attributes']
+    attributes = _attributes_with_patch(span, attributes_patch)
     if status.status_code == StatusCode.ERROR and ATTRIBUTES_LOG_LEVEL_NUM_KEY not in attributes:
-        span['attributes'] = {**attributes, **log_level_attributes('error')}
+        attributes_patch.update(_ERROR_LEVEL_ATTRIBUTES)
     elif status.is_unset:
         level = attributes.get(ATTRIBUTES_LOG_LEVEL_NUM_KEY)
         if isinstance(level, int) and level >= LEVEL_NUMBERS['error']:
@@ -102,69 +211,78 @@ def _set_log_level_on_asgi_send_receive_spans(span: Span) -> None:
     which are generated for every request and are not particularly interesting.
     """
     if _is_asgi_send_receive_span(span.name, span.instrumentation_scope):
-        span.set_attributes(log_level_attributes('debug'))
+        span.set_attributes(_DEBUG_LEVEL_ATTRIBUTES)
 
 
-def _tweak_sqlalchemy_connect_spans(span: ReadableSpanDict) -> None:
+def _tweak_sqlalchemy_connect_spans(span: ReadableSpanDict, attributes_patch: AttributesPatch) -> None:
     # Set the sqlalchemy 'connect' span to debug level so that it's hidden by default.
     # https://pydanticlogfire.slack.com/archives/C06EDRBSAH3/p1720205732316029
-    if span['name'] != 'connect':
-        return
-    scope = span['instrumentation_scope']
-    if scope is None or scope.name != 'opentelemetry.instrumentation.sqlalchemy':  # pragma: no cover
-        return
-    attributes = span['attributes']
+    # `_classify` has already checked the span name and scope.
+    attributes = _attributes_with_patch(span, attributes_patch)
     # We never expect db.statement to be in the attributes here.
     # This is just to be extra sure that we're not accidentally hiding an actual query span.
-    if SpanAttributes.DB_SYSTEM not in attributes or SpanAttributes.DB_STATEMENT in attributes:  # pragma: no cover
+    if _DB_SYSTEM_KEY not in attributes or _DB_STATEMENT_KEY in attributes:  # pragma: no cover
         return
-    span['attributes'] = {**attributes, **log_level_attributes('debug')}
+    attributes_patch.update(_DEBUG_LEVEL_ATTRIBUTES)
 
 
-def _tweak_asgi_send_receive_spans(span: ReadableSpanDict) -> None:
+def _tweak_asgi_send_receive_spans(span: ReadableSpanDict, attributes_patch: AttributesPatch) -> None:
     """Make the name/message of spans generated by OTEL's ASGI middleware more useful.
 
     For example, a single request will typically generate two 'send' spans with the same message,
     e.g. 'GET /foo http send'. This function may add part of the ASGI event type to the name to make it more useful,
     so instead it shows e.g. 'http send response.start' and 'http send response.body'.
+
+    `_classify` has already checked that this is an ASGI send/receive span.
     """
     name = span['name']
-    if _is_asgi_send_receive_span(name, span['instrumentation_scope']):
-        attributes = span['attributes']
-        # The attribute name should be `asgi.event.type` after this is merged and released:
-        # https://github.com/open-telemetry/opentelemetry-python-contrib/pull/2300
-        typ = attributes.get('asgi.event.type') or attributes.get('type')
-        if not (
-            isinstance(typ, str)
-            and typ.startswith(('http.', 'websocket.'))
-            and attributes.get(ATTRIBUTES_MESSAGE_KEY) == name
-        ):  # pragma: no cover
-            return
-
-        # Strip the 'http.' or 'websocket.' prefix from the event type and add it to the span name.
-        if typ in ('websocket.send', 'websocket.receive'):
-            # No point in adding anything in this case, otherwise it'd say e.g. 'websocket send send'.
-            # No other event types in https://asgi.readthedocs.io/en/latest/specs/www.html are redundant like this.
-            new_name = name
-        else:
-            span['name'] = new_name = f'{name} {typ.split(".", 1)[1]}'
+    attributes = _attributes_with_patch(span, attributes_patch)
+    # The attribute name should be `asgi.event.type` after this is merged and released:
+    # https://github.com/open-telemetry/opentelemetry-python-contrib/pull/2300
+    typ = attributes.get('asgi.event.type') or attributes.get('type')
+    if not (
+        isinstance(typ, str)
+        and typ.startswith(('http.', 'websocket.'))
+        and attributes.get(ATTRIBUTES_MESSAGE_KEY) == name
+    ):  # pragma: no cover
+        return
 
-        span['attributes'] = {**attributes, ATTRIBUTES_MESSAGE_KEY: new_name}
+    # Strip the 'http.' or 'websocket.' prefix from the event type and add it to the span name.
+    if typ in ('websocket.send', 'websocket.receive'):
+        # No point in adding anything in this case, otherwise it'd say e.g. 'websocket send send'.
+        # No other event types in https://asgi.readthedocs.io/en/latest/specs/www.html are redundant like this.
+        new_name = name
+    else:
+        span['name'] = new_name = f'{name} {typ.partition(".")[2]}'
+
+    attributes_patch[ATTRIBUTES_MESSAGE_KEY] = new_name
+
+
+# Instrumentations usually name their tracers with the module `__name__`, which is often interned,
+# though not e.g. when the module was imported with `importlib.import_module` and a runtime string.
+# Interning these too means comparisons with scope names can often succeed with just an identity check,
+# and otherwise they fall back to comparing the strings as usual.
+_ASGI_SCOPE_NAMES = frozenset(
+    sys.intern(name)
+    for name in (
+        'opentelemetry.instrumentation.asgi',
+        'opentelemetry.instrumentation.starlette',
+        'opentelemetry.instrumentation.fastapi',
+    )
+)
+_SQLALCHEMY_SCOPE_NAME = sys.intern('opentelemetry.instrumentation.sqlalchemy')
 
 
 def _is_asgi_send_receive_span(name: str, instrumentation_scope: InstrumentationScope | None) -> bool:
+    # Check the name first since it rules out almost all spans.
     return (
-        instrumentation_scope is not None
-        and instrumentation_scope.name
-        in (
-            'opentelemetry.instrumentation.asgi',
-            'opentelemetry.instrumentation.starlette',
-            'opentelemetry.instrumentation.fastapi',
-        )
-    ) and is_asgi_send_receive_span_name(name)
+        name.endswith(ASGI_SEND_RECEIVE_SPAN_NAME_SUFFIXES)
+        and instrumentation_scope is not None
+        and instrumentation_scope.name in _ASGI_SCOPE_NAMES
+    )
 
 
-def _tweak_http_spans(span: ReadableSpanDict):
+def _tweak_http_spans(span: ReadableSpanDict, attributes_patch: AttributesPatch) -> None:
     """Tweak spans from HTTP instrumentations, particularly the span name and message.
 
     Also derives `http.target` from `http.url` if needed.
@@ -180,31 +298,35 @@ def _tweak_http_spans(span: ReadableSpanDict):
     For some spans (e.g. ASGI) this actually removes information (the target) from the span name,
     but leaves it in the message.
     """
-    attributes = span['attributes']
+    attributes = _attributes_with_patch(span, attributes_patch)
 
-    # Check that this generally looks like a span not generated by logfire methods.
+    # `_classify` has already checked that this generally looks like a span not generated by logfire methods,
+    # i.e. it has no message template, and that it has at least one of the HTTP attributes below.
     # This is intended for OTEL instrumentations of frameworks like FastAPI, but written to be general.
-    if ATTRIBUTES_MESSAGE_TEMPLATE_KEY in attributes:
-        return
 
     name = span['name']
     if name != attributes.get(ATTRIBUTES_MESSAGE_KEY):  # pragma: no cover
         return
 
-    method = attributes.get(SpanAttributes.HTTP_METHOD)
-    route = attributes.get(SpanAttributes.HTTP_ROUTE)
-    target = attributes.get(SpanAttributes.HTTP_TARGET)
-    url = attributes.get(SpanAttributes.HTTP_URL)
+    method = attributes.get(_HTTP_METHOD_KEY)
+    route = attributes.get(_HTTP_ROUTE_KEY)
+    target = attributes.get(_HTTP_TARGET_KEY)
+    url = attributes.get(_HTTP_URL_KEY)
     if not (method or route or target or url):
         return
 
-    if not target and url and isinstance(url, str):
+    # Parse the URL at most once, it's needed for the target, server name, and query string.
+    parsed_url: SplitResult | None = None
+    if url and isinstance(url, str):
         try:
-            target = urlparse(url).path
-            span['attributes'] = attributes = {**attributes, SpanAttributes.HTTP_TARGET: target}
+            parsed_url = urlsplit(url)
         except Exception:  # pragma: no cover
             pass
 
+    if not target and parsed_url:
+        target = parsed_url.path
+        attributes_patch[_HTTP_TARGET_KEY] = target
+
     if not method and name in ('HTTP', f'HTTP {target}', f'HTTP {route}'):
         method = 'HTTP'
 
@@ -223,11 +345,8 @@ def _tweak_http_spans(span: ReadableSpanDict):
                 or attributes.get(SpanAttributes.HTTP_SERVER_NAME)
                 or attributes.get(SpanAttributes.HTTP_HOST)
             )
-            if not server_name:
-                try:
-                    server_name = urlparse(url).hostname  # type: ignore
-                except Exception:  # pragma: no cover
-                    pass
+            if not server_name and parsed_url:
+                server_name = parsed_url.hostname
             server_name = server_name or url
             if server_name and isinstance(server_name, str):  # pragma: no branch
                 message_target = server_name + message_target
@@ -241,7 +360,7 @@ def _tweak_http_spans(span: ReadableSpanDict):
             lst.append(' '.join(lst))
 
     # If the name doesn't already consist of method and/or target/route, leave it alone
-    if name not in names + messages:
+    if name not in names and name not in messages:
         return
 
     # For each of name and message, update to the best option, which is the last in the list.
@@ -260,32 +379,41 @@ def _tweak_http_spans(span: ReadableSpanDict):
     # 3. Some query params exist
     # 4. The target doesn't already end with the query string
     #       (it's supposed to according to the spec, but the OTEL libraries don't include it)
-    if (
-        url and target and isinstance(url, str) and isinstance(target, str) and message.endswith(target)
-    ):  # pragma: no branch
-        query_string = urlparse(url).query
-        query_params = parse_qs(query_string)
-        if query_params and not target.endswith(query_string):
-            pairs = [(k, v) for k, vs in query_params.items() for v in vs]
+    if parsed_url and target and isinstance(target, str) and message.endswith(target):  # pragma: no branch
+        query_string = parsed_url.query
+        pairs = parse_qsl(query_string)
+        if pairs and not target.endswith(query_string):
             # Put shorter query params first so that they'll be visible in the UI even if the whole message isn't.
-            pairs.sort(key=lambda pair: (len(pair[0]) + len(pair[1]), pair))
-            # Limit keys and values to 20 chars each.
-            truncated_pairs = [[truncate_string(s, max_length=20, middle='…') for s in pair] for pair in pairs]
+            # Comparing (length, key, value) tuples directly avoids calling a key function for every pair.
+            # Only the shortest few are shown, so there's no need to sort all of them.
+            sorted_params = heapq.nsmallest(_MAX_QUERY_PARAMS_IN_MESSAGE, [(len(k) + len(v), k, v) for k, v in pairs])
             # Show
             #   /path?foo=1&bar=2%203
             # as:
             #   /path ? foo='1' & bar='2 3'
             # to make things nice and readable.
             # Note that we show decoded values, e.g. %20 -> ' '.
-            message += ' ? ' + ' & '.join(f'{k}={v!r}' for k, v in truncated_pairs)
+            message += ' ? ' + ' & '.join(
+                f'{_truncate_query_param(k)}={_truncate_query_param(v)!r}' for _, k, v in sorted_params
+            )
+            if len(pairs) > _MAX_QUERY_PARAMS_IN_MESSAGE:
+                message += ' & …'
 
     if message != name:
-        span['attributes'] = {**attributes, ATTRIBUTES_MESSAGE_KEY: message}
+        attributes_patch[ATTRIBUTES_MESSAGE_KEY] = message
+
+
+_MAX_QUERY_PARAMS_IN_MESSAGE = 16
+
+
+def _truncate_query_param(s: str) -> str:
+    # Limit keys and values to 20 chars each.
+    return truncate_string(s, max_length=20, middle='…')
 
 
-def _summarize_db_statement(span: ReadableSpanDict):
-    attributes = span['attributes']
+def _summarize_db_statement(span: ReadableSpanDict, attributes_patch: AttributesPatch) -> None:
+    attributes = _attributes_with_patch(span, attributes_patch)
     message: str | None = attributes.get(ATTRIBUTES_MESSAGE_KEY)  # type: ignore
     summary = message_from_db_statement(attributes, message, span['name'])
     if summary is not None:
-        span['attributes'] = {**attributes, ATTRIBUTES_MESSAGE_KEY: summary}
+        attributes_patch[ATTRIBUTES_MESSAGE_KEY] = summary
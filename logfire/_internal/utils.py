@@ -28,8 +28,9 @@ from typing import (
 )
 
 from opentelemetry import context, trace as trace_api
+from opentelemetry.context.contextvars_context import ContextVarsRuntimeContext
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import Event, ReadableSpan
+from opentelemetry.sdk.trace import Event
 from opentelemetry.sdk.trace.id_generator import IdGenerator
 from opentelemetry.sdk.util.instrumentation import InstrumentationScope
 from opentelemetry.trace.status import Status
@@ -132,8 +133,8 @@ class ReadableSpanDict(TypedDict):
     """A dictionary representation of a ReadableSpan.
 
     ReadableSpan is immutable, so making modified versions of it is inconvenient and slow.
-    Converting a ReadableSpan to a ReadableSpanDict using span_to_dict makes it easier to modify.
-    See `SpanProcessorWrapper.on_end` for an example of how this is useful.
+    A ReadableSpanDict is easier to modify, and can be passed back to the ReadableSpan constructor.
+    See `MainSpanProcessorWrapper.on_end` for an example of how this is useful.
     """
 
     name: str
@@ -150,24 +151,6 @@ class ReadableSpanDict(TypedDict):
     instrumentation_scope: InstrumentationScope | None
 
 
-def span_to_dict(span: ReadableSpan) -> ReadableSpanDict:
-    """See ReadableSpanDict."""
-    return ReadableSpanDict(
-        name=span.name,
-        context=span.context,
-        parent=span.parent,
-        resource=span.resource,
-        attributes=span.attributes or {},
-        events=span.events,
-        links=span.links,
-        kind=span.kind,
-        status=span.status,
-        start_time=span.start_time,
-        end_time=span.end_time,
-        instrumentation_scope=span.instrumentation_scope,
-    )
-
-
 class UnexpectedResponse(RequestException):
     """An unexpected response was received from the server."""
 
@@ -251,21 +234,42 @@ except AttributeError:  # pragma: no cover
     pass
 
 
+_get_current_context: Callable[[], context.Context] = context.get_current
+
+try:
+    # `is_instrumentation_suppressed` is called for every span and log, so with the default runtime context,
+    # read its ContextVar directly instead of going through `context.get_value` and `context.get_current`.
+    _runtime_context = context._RUNTIME_CONTEXT  # type: ignore
+    if isinstance(_runtime_context, ContextVarsRuntimeContext):  # pragma: no branch
+        _get_current_context = _runtime_context._current_context.get  # type: ignore
+except AttributeError:  # pragma: no cover
+    pass
+
+
 def is_instrumentation_suppressed() -> bool:
     """Return True if the `suppress_instrumentation` context manager is currently active.
 
     This means that any logs/spans generated by logfire or OpenTelemetry will not be logged in any way.
     """
-    return any(context.get_value(key) for key in SUPPRESS_INSTRUMENTATION_CONTEXT_KEYS)
+    current_context = _get_current_context()
+    return any(current_context.get(key) for key in SUPPRESS_INSTRUMENTATION_CONTEXT_KEYS)
 
 
-@contextmanager
-def suppress_instrumentation():
-    """Context manager to suppress all logs/spans generated by logfire or OpenTelemetry."""
+def suppressed_context() -> context.Context:
+    """Return a copy of the current context with instrumentation suppressed, to be passed to `context.attach`.
+
+    Prefer `suppress_instrumentation` unless avoiding the context manager overhead matters.
+    """
     new_context = context.get_current()
     for key in SUPPRESS_INSTRUMENTATION_CONTEXT_KEYS:
         new_context = context.set_value(key, True, new_context)
-    token = context.attach(new_context)
+    return new_context
+
+
+@contextmanager
+def suppress_instrumentation():
+    """Context manager to suppress all logs/spans generated by logfire or OpenTelemetry."""
+    token = context.attach(suppressed_context())
     try:
         yield
     finally:
@@ -375,8 +379,11 @@ def maybe_capture_server_headers(capture: bool):
         os.environ['OTEL_INSTRUMENTATION_HTTP_CAPTURE_HEADERS_SERVER_RESPONSE'] = '.*'
 
 
+ASGI_SEND_RECEIVE_SPAN_NAME_SUFFIXES = (' http send', ' http receive', ' websocket send', ' websocket receive')
+
+
 def is_asgi_send_receive_span_name(name: str) -> bool:
-    return name.endswith((' http send', ' http receive', ' websocket send', ' websocket receive'))
+    return name.endswith(ASGI_SEND_RECEIVE_SPAN_NAME_SUFFIXES)
 
 
 def _default_ms_timestamp_generator() -> int:
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import pytest
+from inline_snapshot import snapshot
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+from opentelemetry.sdk.util.instrumentation import InstrumentationScope
+from opentelemetry.trace import Status, StatusCode
+
+from logfire._internal.constants import log_level_attributes
+from logfire._internal.exporters.processor_wrapper import MainSpanProcessorWrapper
+from logfire._internal.scrubbing import NOOP_SCRUBBER
+
+
+class CollectingSpanProcessor(SpanProcessor):
+    """Collects the spans passed on by `wrapper`, a `MainSpanProcessorWrapper` around this processor."""
+
+    def __init__(self) -> None:
+        self.spans: list[ReadableSpan] = []
+        self.wrapper = MainSpanProcessorWrapper(self, NOOP_SCRUBBER)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        self.spans.append(span)
+
+
+@pytest.fixture
+def collector() -> CollectingSpanProcessor:
+    return CollectingSpanProcessor()
+
+
+def test_unchanged_spans_forwarded_as_is(collector: CollectingSpanProcessor):
+    plain = ReadableSpan(name='plain', attributes={'logfire.msg_template': 'plain', **log_level_attributes('info')})
+    error = ReadableSpan(name='error', status=Status(StatusCode.ERROR))
+    # An explicit OK status isn't overridden by an error level.
+    ok = ReadableSpan(name='ok', attributes=log_level_attributes('error'), status=Status(StatusCode.OK))
+    collector.wrapper.on_end(plain)
+    collector.wrapper.on_end(error)
+    collector.wrapper.on_end(ok)
+
+    # Nothing needed changing, so the original span is passed straight through.
+    assert collector.spans[0] is plain
+    # The level was set to error, so the span was rebuilt.
+    assert collector.spans[1] is not error
+    assert collector.spans[1].attributes == log_level_attributes('error')
+    assert collector.spans[2] is ok
+
+
+def test_tweaked_but_unchanged_spans_forwarded_as_is(collector: CollectingSpanProcessor):
+    # This looks like it might be an HTTP span, but the name isn't the message so it's left alone.
+    span = ReadableSpan(name='custom', attributes={'http.method': 'GET'})
+    collector.wrapper.on_end(span)
+
+    [forwarded] = collector.spans
+    assert forwarded is span
+
+
+def test_empty_http_attributes_forwarded_as_is(collector: CollectingSpanProcessor):
+    # An HTTP attribute is present but empty, so there's nothing to build a name or message from.
+    span = ReadableSpan(name='x', attributes={'logfire.msg': 'x', 'http.method': ''})
+    collector.wrapper.on_end(span)
+
+    [forwarded] = collector.spans
+    assert forwarded is span
+
+
+def test_later_tweaks_see_earlier_attribute_changes(collector: CollectingSpanProcessor):
+    # A failed sqlalchemy connection: the connect tweak sets the level to debug first,
+    # so the error status shouldn't then override that level.
+    connect = ReadableSpan(
+        name='connect',
+        attributes={'db.system': 'sqlite'},
+        status=Status(StatusCode.ERROR),
+        instrumentation_scope=InstrumentationScope('opentelemetry.instrumentation.sqlalchemy'),
+    )
+    collector.wrapper.on_end(connect)
+
+    [span] = collector.spans
+    assert span.attributes == {'db.system': 'sqlite', **log_level_attributes('debug')}
+    assert span.status.status_code == StatusCode.ERROR
+
+    # Likewise, a connect span with an error level but no status gets the debug level,
+    # so its status shouldn't then be set to error.
+    collector.spans.clear()
+    connect = ReadableSpan(
+        name='connect',
+        attributes={'db.system': 'sqlite', **log_level_attributes('error')},
+        instrumentation_scope=InstrumentationScope('opentelemetry.instrumentation.sqlalchemy'),
+    )
+    collector.wrapper.on_end(connect)
+
+    [span] = collector.spans
+    assert span.attributes == {'db.system': 'sqlite', **log_level_attributes('debug')}
+    assert span.status.status_code == StatusCode.UNSET
+
+
+def test_custom_db_statement_message_forwarded_as_is(collector: CollectingSpanProcessor):
+    # The message differs from the span name, so it's kept rather than summarizing the statement.
+    span = ReadableSpan(name='SELECT', attributes={'logfire.msg': 'custom', 'db.statement': 'SELECT * FROM users'})
+    collector.wrapper.on_end(span)
+
+    [forwarded] = collector.spans
+    assert forwarded is span
+
+
+def test_many_query_params(collector: CollectingSpanProcessor):
+    query = '&'.join(f'param{i}={"x" * (i % 3)}{i}' for i in range(20))
+    span = ReadableSpan(
+        name='GET /path',
+        attributes={
+            'logfire.msg': 'GET /path',
+            'http.method': 'GET',
+            'http.url': f'https://example.com/path?{query}',
+        },
+    )
+    collector.wrapper.on_end(span)
+
+    # Only the 16 shortest params are shown.
+    [span] = collector.spans
+    assert (span.attributes or {})['logfire.msg'] == snapshot(
+        "GET /path ? param0='0' & param3='3' & param6='6' & param9='9' & param1='x1' & param4='x4' & param7='x7' & param12='12' & param15='15' & param18='18' & param2='xx2' & param5='xx5' & param8='xx8' & param10='x10' & param13='x13' & param16='x16' & …"
+    )
@@ -14,6 +14,7 @@ from unittest.mock import patch
 import pytest
 from dirty_equals import IsInt, IsJson, IsStr
 from inline_snapshot import Is, snapshot
+from opentelemetry import context
 from opentelemetry.metrics import get_meter
 from opentelemetry.proto.common.v1.common_pb2 import AnyValue
 from opentelemetry.sdk.metrics.export import InMemoryMetricReader
@@ -37,7 +38,11 @@ from logfire._internal.constants import (
 from logfire._internal.formatter import FormattingFailedWarning, InspectArgumentsFailedWarning
 from logfire._internal.main import NoopSpan
 from logfire._internal.tracer import record_exception
-from logfire._internal.utils import SeededRandomIdGenerator, is_instrumentation_suppressed
+from logfire._internal.utils import (
+    SUPPRESS_INSTRUMENTATION_CONTEXT_KEYS,
+    SeededRandomIdGenerator,
+    is_instrumentation_suppressed,
+)
 from logfire.integrations.logging import LogfireLoggingHandler
 from logfire.testing import TestExporter
 from tests.test_metrics import get_collected_metrics
@@ -2988,6 +2993,20 @@ def test_suppress_instrumentation(exporter: TestExporter):
     )
 
 
+# The OTel key contains a random UUID, so use the index as the test ID to keep it stable for pytest-xdist.
+@pytest.mark.parametrize(
+    'key', SUPPRESS_INSTRUMENTATION_CONTEXT_KEYS, ids=range(len(SUPPRESS_INSTRUMENTATION_CONTEXT_KEYS))
+)
+def test_is_instrumentation_suppressed_by_otel_key(key: str):
+    assert not is_instrumentation_suppressed()
+    token = context.attach(context.set_value(key, True))
+    try:
+        assert is_instrumentation_suppressed()
+    finally:
+        context.detach(token)
+    assert not is_instrumentation_suppressed()
+
+
 def test_internal_exception_span(caplog: pytest.LogCaptureFixture, exporter: TestExporter):
     with logfire.span('foo', _tags=123) as span:  # type: ignore
         # _tags=123 causes an exception (tags should be an iterable)